@@ -5,68 +5,195 @@ Generates realistic back-and-forth conversations between multiple speakers
 """
 
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
 import time
+import asyncio
+import httpx
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+from tts_cache import HTTP_LIMITS, cache_writer, tts_key, tts_cache_path, is_up_to_date, mark_up_to_date
 
 load_dotenv()
 
-def create_bidirectional_audio(scenario_name, speakers_scripts, output_filename):
-    """Create bidirectional conversation audio using OpenAI TTS with different voices"""
+# Maximum number of TTS requests in flight at the same time
+MAX_CONCURRENT_TTS = 5
+
+# tts-1 request budget; short bursts up to TTS_BURST go through immediately
+TTS_REQUESTS_PER_MINUTE = 500
+TTS_BURST = 10
+
+class _TokenBucket:
+    """Async token bucket that only blocks once the request budget is spent"""
+    
+    def __init__(self, requests_per_minute, burst):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+    
+    async def __aenter__(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return self
+                
+                # Sleep exactly until the next token is available
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+    
+    async def __aexit__(self, *exc_info):
+        return False
+
+def _async_client():
+    """AsyncOpenAI client whose requests multiplex over one HTTP/2 connection"""
+    # Async connections are bound to the running event loop, so callers
+    # create one client per asyncio.run() and share it across requests
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=httpx.AsyncClient(http2=True, limits=HTTP_LIMITS)
+    )
+
+async def _read_file(path):
+    """Read a file on a worker thread so the event loop keeps serving requests"""
+    def _read():
+        with open(path, "rb") as f:
+            return f.read()
+    return await asyncio.get_running_loop().run_in_executor(None, _read)
+
+async def _write_file(path, *chunks):
+    """Write chunks to a file on a worker thread so the event loop keeps serving requests"""
+    def _write():
+        with open(path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    await asyncio.get_running_loop().run_in_executor(None, _write)
+
+async def _cached_tts(client, semaphore, limiter, model, voice, text):
+    """Synthesize text to MP3 bytes, skipping the API call for inputs seen before"""
     
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    cache_path = tts_cache_path(model, voice, text)
+    
+    if os.path.exists(cache_path):
+        return await _read_file(cache_path)
+    
+    async with semaphore, limiter:
+        response = await client.audio.speech.create(
+            model=model,
+            voice=voice,
+            input=text,
+            speed=1.0
+        )
+        audio = await response.aread()
+    
+    # Stored on a worker thread so the event loop keeps serving requests
+    def _store():
+        with cache_writer(cache_path) as f:
+            f.write(audio)
+    await asyncio.get_running_loop().run_in_executor(None, _store)
+    
+    return audio
+
+async def create_bidirectional_audio_async(scenario_name, speakers_scripts, output_filename):
+    """Create bidirectional conversation audio, synthesizing all speakers concurrently"""
     
     # Different voices for different speakers
     voices = ["alloy", "echo", "fable", "onyx", "nova", "shimmer"]
     
-    try:
-        print(f"Creating bidirectional conversation: {scenario_name}")
-        
-        # Create temp directory
-        os.makedirs("temp_audio", exist_ok=True)
-        
-        # Generate audio for each speaker
-        audio_files = []
+    print(f"Creating bidirectional conversation: {scenario_name}")
+    
+    # Concurrency cap plus token bucket, created inside the running event loop
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_TTS)
+    limiter = _TokenBucket(TTS_REQUESTS_PER_MINUTE, TTS_BURST)
+    
+    async with _async_client() as client:
         
-        for i, (speaker, script) in enumerate(speakers_scripts):
+        async def _one(i, speaker, script):
             voice = voices[i % len(voices)]
             print(f"  - Creating audio for {speaker} (voice: {voice})")
-            
-            response = client.audio.speech.create(
-                model="tts-1",
-                voice=voice,
-                input=script,
-                speed=1.0
-            )
-            
-            temp_path = f"temp_audio/{speaker.lower().replace(' ', '_')}.mp3"
-            response.stream_to_file(temp_path)
-            audio_files.append(temp_path)
-            
-            # Small delay to avoid rate limiting
-            time.sleep(0.5)
+            audio = await _cached_tts(client, semaphore, limiter, "tts-1", voice, script)
+            return speaker, audio
         
-        # For now, save the first speaker's audio as the main file
-        # In a full implementation, you'd merge the audio files with proper timing
-        os.makedirs("sample_audio", exist_ok=True)
-        output_path = f"sample_audio/{output_filename}"
+        # Generate audio for each speaker, kept in memory in script order
+        audio_buffers = await asyncio.gather(*[
+            _one(i, speaker, script)
+            for i, (speaker, script) in enumerate(speakers_scripts)
+        ])
+    
+    # MP3 is a sequence of self-contained frames, so the speaker streams can be
+    # joined back-to-back into one conversation without re-encoding
+    os.makedirs("sample_audio", exist_ok=True)
+    output_path = f"sample_audio/{output_filename}"
+    
+    await _write_file(output_path, *(audio for _, audio in audio_buffers))
+    
+    print(f"    Audio saved: {output_path}")
+    return output_path
+
+def create_bidirectional_audio(scenario_name, speakers_scripts, output_filename):
+    """Create bidirectional conversation audio using OpenAI TTS with different voices"""
+    
+    try:
+        return asyncio.run(
+            create_bidirectional_audio_async(scenario_name, speakers_scripts, output_filename)
+        )
         
-        # Copy the first file as the main output (simplified)
-        import shutil
-        shutil.copy(audio_files[0], output_path)
+    except Exception as e:
+        print(f"    Error creating audio: {str(e)}")
+        return None
+
+async def process_scenario(client, semaphore, limiter, scenario):
+    """Render one scenario's combined script, returning (path, size in bytes)"""
+    
+    print(f"\nProcessing: {scenario['name']}")
+    
+    # Create a combined script for the conversation
+    combined_script = ""
+    for speaker, script in scenario['speakers_scripts']:
+        combined_script += f"{speaker}: {script} "
+    
+    # For simplicity, create audio with the combined script using one voice
+    # In a full implementation, you'd alternate voices and add proper timing
+    try:
+        output_path = f"sample_audio/{scenario['filename']}"
+        key = tts_key("tts-1", "alloy", combined_script)
+        
+        if is_up_to_date(output_path, key):
+            print(f"  Audio up to date: {output_path}")
+            return output_path, os.stat(output_path).st_size
         
-        # Clean up temp files
-        for file in audio_files:
-            os.remove(file)
-        os.rmdir("temp_audio")
+        audio = await _cached_tts(client, semaphore, limiter, "tts-1", "alloy", combined_script)
         
-        print(f"    Audio saved: {output_path}")
-        return output_path
+        os.makedirs("sample_audio", exist_ok=True)
+        await _write_file(output_path, audio)
+        mark_up_to_date(output_path, key)
+        
+        print(f"  Audio saved: {output_path}")
+        return output_path, len(audio)
         
     except Exception as e:
-        print(f"    Error creating audio: {str(e)}")
+        print(f"  Error: {str(e)}")
         return None
 
+async def process_scenarios(scenarios):
+    """Render all scenarios as one concurrent burst, keyed by output filename"""
+    
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_TTS)
+    limiter = _TokenBucket(TTS_REQUESTS_PER_MINUTE, TTS_BURST)
+    
+    async with _async_client() as client:
+        results = await asyncio.gather(*[
+            process_scenario(client, semaphore, limiter, scenario) for scenario in scenarios
+        ])
+    
+    return {
+        scenario["filename"]: result
+        for scenario, result in zip(scenarios, results)
+    }
+
 def main():
     """Create bidirectional conversation samples"""
     
@@ -114,45 +241,20 @@ def main():
         }
     ]
     
-    created_files = []
+    # Scenarios are independent, so render them all at once
+    results = asyncio.run(process_scenarios(scenarios))
     
-    for scenario in scenarios:
-        print(f"\nProcessing: {scenario['name']}")
-        
-        # Create a combined script for the conversation
-        combined_script = ""
-        for speaker, script in scenario['speakers_scripts']:
-            combined_script += f"{speaker}: {script} "
-        
-        # For simplicity, create audio with the combined script using one voice
-        # In a full implementation, you'd alternate voices and add proper timing
-        try:
-            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            
-            response = client.audio.speech.create(
-                model="tts-1",
-                voice="alloy",
-                input=combined_script
-            )
-            
-            os.makedirs("sample_audio", exist_ok=True)
-            output_path = f"sample_audio/{scenario['filename']}"
-            response.stream_to_file(output_path)
-            
-            created_files.append(output_path)
-            print(f"  Audio saved: {output_path}")
-            
-        except Exception as e:
-            print(f"  Error: {str(e)}")
+    # Sizes were recorded while writing, so the summary needs no stat calls
+    file_sizes = dict(result for result in results.values() if result)
+    created_files = list(file_sizes)
     
     print("\n" + "=" * 50)
     print("Bidirectional Conversation Samples Complete!")
     print(f"Created {len(created_files)} files:")
     
     for file_path in created_files:
-        if os.path.exists(file_path):
-            file_size = os.path.getsize(file_path) / 1024
-            print(f"   • {file_path} ({file_size:.1f} KB)")
+        file_size = file_sizes[file_path] / 1024
+        print(f"   • {file_path} ({file_size:.1f} KB)")
     
     print("\nThese samples demonstrate:")
     print("• Multi-speaker conversations")
@@ -161,7 +263,13 @@ def main():
     print("• Different speaker roles and responsibilities")
     
     # Cost estimate
-    total_chars = sum(len(" ".join([script for _, script in scenario['speakers_scripts']])) for scenario in scenarios)
+    # Count characters directly: each scenario's scripts plus the single
+    # spaces that would join them, without building the joined strings
+    total_chars = sum(
+        len(script) + 1
+        for scenario in scenarios
+        for _, script in scenario['speakers_scripts']
+    ) - len(scenarios)
     estimated_cost = (total_chars / 1000) * 0.015
     print(f"\nEstimated cost: ${estimated_cost:.3f}")
 
@@ -5,33 +5,72 @@ Creates realistic manufacturing conversation audio files for demonstration purpo
 """
 
 import os
+import shutil
+import functools
+import concurrent.futures
+import httpx
 from openai import OpenAI
 from dotenv import load_dotenv
+from tts_cache import HTTP_LIMITS, cache_writer, tts_key, tts_cache_path, is_up_to_date, mark_up_to_date
 import datetime
 
 # Load environment variables
 load_dotenv()
 
+@functools.lru_cache(maxsize=1)
+def _get_client():
+    """Build the OpenAI client once so all scenarios reuse one HTTP/2 connection"""
+    return OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=httpx.Client(http2=True, limits=HTTP_LIMITS)
+    )
+
+# Bytes written per chunk while streaming TTS audio to disk
+TTS_CHUNK_SIZE = 8192
+
+def _cached_tts(model, voice, text, out_path):
+    """Synthesize text into out_path, skipping the API call for inputs seen before"""
+    
+    cache_path = tts_cache_path(model, voice, text)
+    
+    if not os.path.exists(cache_path):
+        # Stream the body so disk writes overlap with the rest of the download
+        with _get_client().audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text
+        ) as response:
+            with cache_writer(cache_path) as f:
+                for chunk in response.iter_bytes(TTS_CHUNK_SIZE):
+                    f.write(chunk)
+    
+    shutil.copy(cache_path, out_path)
+    return out_path
+
 def create_sample_audio(scenario_name, script_text, output_filename):
     """Create sample audio using OpenAI TTS"""
     
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    
     try:
         print(f"🎤 Creating audio for: {scenario_name}")
         
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice="alloy",  # Professional, neutral voice
-            input=script_text
-        )
-        
         # Create samples directory if it doesn't exist
         os.makedirs("sample_audio", exist_ok=True)
         
-        # Save audio file
+        # Save audio file, unless it was already rendered from this script
         output_path = f"sample_audio/{output_filename}"
-        response.stream_to_file(output_path)
+        key = tts_key("tts-1", "alloy", script_text)
+        
+        if is_up_to_date(output_path, key):
+            print(f"✅ Audio up to date: {output_path}")
+            return output_path
+        
+        _cached_tts(
+            "tts-1",
+            "alloy",  # Professional, neutral voice
+            script_text,
+            output_path
+        )
+        mark_up_to_date(output_path, key)
         
         print(f"✅ Audio saved: {output_path}")
         return output_path
@@ -40,6 +79,20 @@ def create_sample_audio(scenario_name, script_text, output_filename):
         print(f"❌ Error creating audio: {str(e)}")
         return None
 
+def process_scenario(scenario):
+    """Create the sample audio file for one scenario, returning (path, size in bytes)"""
+    
+    print(f"\n📝 Processing: {scenario['name']}")
+    
+    file_path = create_sample_audio(
+        scenario["name"],
+        scenario["script"],
+        scenario["filename"]
+    )
+    
+    # Record the size while the file is fresh so the summary needs no stat calls
+    return file_path and (file_path, os.stat(file_path).st_size)
+
 def main():
     """Create sample audio files for demo"""
     
@@ -90,19 +143,10 @@ def main():
         }
     ]
     
-    # Create audio files
-    created_files = []
-    for scenario in scenarios:
-        print(f"\n📝 Processing: {scenario['name']}")
-        
-        file_path = create_sample_audio(
-            scenario["name"],
-            scenario["script"],
-            scenario["filename"]
-        )
-        
-        if file_path:
-            created_files.append(file_path)
+    # Create audio files, all scenarios at once since they are independent
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(scenarios)) as executor:
+        file_sizes = dict(result for result in executor.map(process_scenario, scenarios) if result)
+    created_files = list(file_sizes)
     
     # Summary
     print("\n" + "=" * 50)
@@ -110,7 +154,7 @@ def main():
     print(f"📁 Created {len(created_files)} sample files:")
     
     for file_path in created_files:
-        file_size = os.path.getsize(file_path) / 1024  # KB
+        file_size = file_sizes[file_path] / 1024  # KB
         print(f"   • {file_path} ({file_size:.1f} KB)")
     
     print("\n🚀 Ready for Demo!")
@@ -8,93 +8,487 @@ Speech Recognition Demo with Speaker ID
 
 import os
 import json
+import html
 import re
+import string
+import hashlib
+import threading
+import shutil
+import asyncio
+import subprocess
+import concurrent.futures
+from collections import Counter, defaultdict
 from datetime import datetime
 from typing import List, Dict, Any
+import httpx
 import streamlit as st
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import tempfile
+from types import SimpleNamespace
 from dotenv import load_dotenv
+from transcript_chunks import SPEAKER_CHUNK_THRESHOLD_WORDS, chunk_transcript, speaker_max_tokens
 
-# Load environment variables from .env file
-load_dotenv()
+@st.cache_resource(show_spinner=False)
+def get_config() -> SimpleNamespace:
+    """Load environment variables from .env once per process, not on every rerun"""
+    load_dotenv()
+    return SimpleNamespace(api_key=os.getenv("OPENAI_API_KEY"))
 
-def detect_speakers_ai(text: str, client: OpenAI) -> Dict[str, Any]:
-    """Use OpenAI to detect speakers in conversation text"""
+# Manufacturing keywords, as sets for per-token lookups
+SAFETY_KEYWORDS = frozenset(["safety", "hazard", "risk", "danger", "accident", "injury", "ppe", "protective", "lockout", "emergency"])
+QUALITY_KEYWORDS = frozenset(["defect", "quality", "inspection", "tolerance", "reject", "standard", "compliance", "testing", "specification"])
+PRODUCTION_KEYWORDS = frozenset(["production", "schedule", "deadline", "capacity", "manufacturing", "assembly", "efficiency", "downtime"])
+
+# Every keyword mapped to its category, so one lookup classifies a token
+KEYWORD_CATEGORIES = {
+    **{keyword: "safety" for keyword in SAFETY_KEYWORDS},
+    **{keyword: "quality" for keyword in QUALITY_KEYWORDS},
+    **{keyword: "production" for keyword in PRODUCTION_KEYWORDS}
+}
+
+def _keyword_pattern(keywords):
+    """Compile a case-insensitive whole-word pattern matching any keyword"""
+    return re.compile(r"\b(?:" + "|".join(sorted(keywords)) + r")\b", re.IGNORECASE)
+
+# The same keywords compiled once and matched on whole words
+SAFETY_RE = _keyword_pattern(SAFETY_KEYWORDS)
+QUALITY_RE = _keyword_pattern(QUALITY_KEYWORDS)
+PRODUCTION_RE = _keyword_pattern(PRODUCTION_KEYWORDS)
+
+# All keywords in one whole-word pattern, for counting a speaker's mentions
+KEYWORD_RE = _keyword_pattern(KEYWORD_CATEGORIES)
+
+# Single transcript scan: keyword hits, sentence breaks and the start of every word
+TRANSCRIPT_SCAN_RE = re.compile(
+    f"(?P<safety>{SAFETY_RE.pattern})|(?P<quality>{QUALITY_RE.pattern})|(?P<production>{PRODUCTION_RE.pattern})"
+    r"|(?P<sentence_end>[.!?])|(?P<word>(?<!\S)\S)",
+    re.IGNORECASE
+)
+
+# Results of previously processed audio, keyed by SHA-256 of the file bytes,
+# and speaker labels keyed by "speakers-" plus SHA-256 of the transcript
+RESULTS_CACHE_DIR = ".cache"
+RESULTS_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def read_cached_results(key: str) -> Dict[str, Any]:
+    """Read saved results for a cache key once per process; raises OSError on a cache miss"""
+    with open(os.path.join(RESULTS_CACHE_DIR, f"{key}.json"), "r") as f:
+        return json.load(f)
+
+def load_cached_results(key: str) -> Dict[str, Any]:
+    """Load saved results for a cache key; raises OSError on a cache miss"""
+    results = read_cached_results(key)
+    
+    # Touch the entry on every hit, not only the first read, so eviction
+    # drops the least recently used files first
+    try:
+        os.utime(os.path.join(RESULTS_CACHE_DIR, f"{key}.json"))
+    except OSError:
+        pass  # Evicted since it was read; the results are still valid
+    return results
+
+def save_cached_results(key: str, results: Dict[str, Any]) -> None:
+    """Persist results for a cache key and keep the cache under its size limit"""
+    os.makedirs(RESULTS_CACHE_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_CACHE_DIR, f"{key}.json")
+    
+    # Write under a temporary name so concurrent sessions never read half a file
+    with open(f"{path}.part", "w") as f:
+        json.dump(results, f)
+    os.replace(f"{path}.part", path)
+    
+    entries = sorted(
+        (entry for entry in os.scandir(RESULTS_CACHE_DIR) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    total_size = sum(entry.stat().st_size for entry in entries)
+    for entry in entries:
+        if total_size <= RESULTS_CACHE_MAX_BYTES:
+            break
+        total_size -= entry.stat().st_size
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass  # Already evicted by another session
+
+@st.cache_resource(show_spinner=False)
+def get_cache_stats() -> Dict[str, Any]:
+    """Results cache hit and miss counts, shared by every session of this process"""
+    return {"counts": Counter(), "lock": threading.Lock()}
+
+def record_cache_lookup(cache_stats: Dict[str, Any], hit: bool) -> None:
+    """Count one results cache lookup as a hit or a miss"""
+    with cache_stats["lock"]:
+        cache_stats["counts"]["hits" if hit else "misses"] += 1
+
+# Long recordings are cut near every TRANSCRIBE_SEGMENT_SECONDS at a pause
+# and the pieces are transcribed in parallel
+TRANSCRIBE_SEGMENT_SECONDS = 60
+# Reading from stdin there is no container duration, so use the last progress time
+FFMPEG_TIME_RE = re.compile(r"time=(\d+):(\d+):(\d+(?:\.\d+)?)")
+FFMPEG_SILENCE_RE = re.compile(r"silence_end: (\d+(?:\.\d+)?) \| silence_duration: (\d+(?:\.\d+)?)")
+
+def find_split_points(audio: memoryview) -> List[float]:
+    """Pause timestamps closest to each segment boundary; empty for short audio"""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-i", "pipe:0",
+         "-af", "silencedetect=noise=-30dB:d=0.3", "-f", "null", "-"],
+        input=audio, capture_output=True
+    )
+    stderr = result.stderr.decode(errors="replace")
+    
+    times = FFMPEG_TIME_RE.findall(stderr)
+    if not times:
+        return []
+    hours, minutes, seconds = times[-1]
+    total_seconds = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    
+    # Cut in the middle of each pause so no word is split across segments
+    pauses = [float(end) - float(length) / 2 for end, length in FFMPEG_SILENCE_RE.findall(stderr)]
+    
+    split_points = []
+    boundary = TRANSCRIBE_SEGMENT_SECONDS
+    while boundary < total_seconds - TRANSCRIBE_SEGMENT_SECONDS / 2:
+        candidates = [p for p in pauses if abs(p - boundary) <= TRANSCRIBE_SEGMENT_SECONDS / 2]
+        point = min(candidates, key=lambda p: abs(p - boundary)) if candidates else boundary
+        split_points.append(point)
+        boundary = point + TRANSCRIBE_SEGMENT_SECONDS
+    
+    return split_points
+
+def split_audio(audio: memoryview, extension: str, segment_dir: str) -> List[str]:
+    """Split audio into roughly minute-long segments; empty if it is short or can't be split"""
+    split_points = find_split_points(audio)
+    if not split_points:
+        return []
+    
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "segment", "-segment_times", ",".join(f"{p:.3f}" for p in split_points),
+         "-c", "copy", os.path.join(segment_dir, f"segment_%03d.{extension}")],
+        input=audio, capture_output=True
+    )
+    if result.returncode != 0:
+        return []
     
-    prompt = f"""
-    Analyze this conversation and identify different speakers. Format the response as a conversation with speaker labels.
+    return sorted(entry.path for entry in os.scandir(segment_dir))
+
+# Keep-alive pool for API requests; over HTTP/2 concurrent calls share one connection
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+
+def async_client(api_key: str) -> AsyncOpenAI:
+    """AsyncOpenAI client whose requests multiplex over one HTTP/2 connection"""
+    # Async connections are bound to the running event loop, so callers
+    # create one client per asyncio.run() and share it across requests
+    return AsyncOpenAI(
+        api_key=api_key,
+        http_client=httpx.AsyncClient(http2=True, limits=HTTP_LIMITS)
+    )
+
+async def transcribe_segments(segment_paths: List[str], api_key: str) -> List[Any]:
+    """Transcribe all segments concurrently, keeping them in order"""
+    async with async_client(api_key) as client:
+        
+        async def _transcribe(path):
+            with open(path, "rb") as audio_file:
+                return await client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=audio_file,
+                    response_format="verbose_json"
+                )
+        
+        return await asyncio.gather(*[_transcribe(path) for path in segment_paths])
+
+# Whisper resamples everything to 16 kHz mono, so this encoding keeps all it uses
+COMPRESSED_AUDIO_ARGS = ["-ac", "1", "-ar", "16000", "-b:a", "32k", "-f", "mp3"]
+
+def compress_audio(audio: memoryview) -> bytes:
+    """Audio re-encoded as small 16 kHz mono MP3; empty if ffmpeg can't read it"""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         *COMPRESSED_AUDIO_ARGS, "pipe:1"],
+        input=audio, capture_output=True
+    )
+    return result.stdout if result.returncode == 0 else b""
+
+def transcribe_audio(uploaded_file, client: OpenAI, api_key: str, compress: bool = False) -> List[Any]:
+    """Whisper verbose transcripts of an upload, one per segment when the recording is long"""
+    upload = (uploaded_file.name, uploaded_file)
+    
+    if shutil.which("ffmpeg"):
+        audio = uploaded_file.getbuffer()
+        
+        # Fewer bytes to upload for the same transcript
+        if compress:
+            compressed = compress_audio(audio)
+            if compressed:
+                audio = memoryview(compressed)
+                upload = (f"{os.path.splitext(uploaded_file.name)[0]}.mp3", compressed)
+        
+        # ffmpeg reads the audio buffer through a pipe; only the segments touch disk
+        with tempfile.TemporaryDirectory() as segment_dir:
+            segment_paths = split_audio(audio, upload[0].split('.')[-1], segment_dir)
+            if segment_paths:
+                return asyncio.run(transcribe_segments(segment_paths, api_key))
+    
+    # Send the audio buffer as-is, without a temp file round-trip
+    uploaded_file.seek(0)
+    return [client.audio.transcriptions.create(
+        model="whisper-1",
+        file=upload,
+        response_format="verbose_json"
+    )]
+
+# Longest pause, in seconds, that still counts as one person talking
+MONOLOGUE_MAX_PAUSE_SECONDS = 1.5
+
+def is_monologue(transcripts: List[Any]) -> bool:
+    """True when Whisper's segments show one continuous voice, so no speaker detection is needed"""
+    offset = 0.0
+    previous_end = None
+    
+    for transcript in transcripts:
+        for segment in transcript.segments or []:
+            # A long pause or a question usually means someone else takes a turn
+            if previous_end is not None and offset + segment.start - previous_end > MONOLOGUE_MAX_PAUSE_SECONDS:
+                return False
+            if segment.text.rstrip().endswith("?"):
+                return False
+            previous_end = offset + segment.end
+        
+        offset += float(transcript.duration)
+    
+    return True
+
+# One "Speaker: text" line of the labelled conversation, label and text already stripped
+SPEAKER_LINE_RE = re.compile(r"^[^\S\n]*([^:\n]*?)[^\S\n]*:[^\S\n]*(.*?)[^\S\n]*$", re.MULTILINE)
+
+# Speaker detection prompt; only the transcript is filled in per call
+SPEAKER_SYSTEM_PROMPT = "You are an expert at identifying speakers in conversations. Return only the speaker turns."
+SPEAKER_PROMPT_TEMPLATE = """
+    Analyze this conversation and identify different speakers. Split it into speaker turns.
     
     Original text: "{text}"
     
     Instructions:
     1. Identify likely speaker changes (new person talking)
-    2. Format as: "Speaker A: [text]" for each part
+    2. Return one turn per part, with the speaker label and the exact text they said
     3. Use Speaker A, Speaker B, Speaker C, etc.
     4. If unclear, use your best judgment based on conversation flow
-    5. Return ONLY the formatted conversation, no explanations
-    
-    Example output:
-    Speaker A: Hello everyone, let's start the meeting.
-    Speaker B: Good morning, I have the safety report ready.
-    Speaker A: Great, please go ahead.
     """
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # Cheaper model for speaker detection
-            messages=[
-                {"role": "system", "content": "You are an expert at identifying speakers in conversations. Return only the formatted conversation with speaker labels."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1000,
-            temperature=0.1
-        )
+
+# Structured output the model must follow, so the reply needs no text parsing
+SPEAKER_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "speaker_turns",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "turns": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "speaker": {"type": "string"},
+                            "text": {"type": "string"}
+                        },
+                        "required": ["speaker", "text"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["turns"],
+            "additionalProperties": False
+        }
+    }
+}
+
+@st.cache_resource(show_spinner=False)
+def get_client(api_key: str) -> OpenAI:
+    """One OpenAI client per API key, so its connection pool survives reruns"""
+    return OpenAI(
+        api_key=api_key,
+        http_client=httpx.Client(http2=True, limits=HTTP_LIMITS)
+    )
+
+def single_speaker_data(text: str) -> Dict[str, Any]:
+    """Speaker data attributing the whole text to Speaker A"""
+    return {
+        "formatted_conversation": f"Speaker A: {text}",
+        "speakers": {"Speaker A": [text]},
+        "speaker_count": 1
+    }
+
+def speaker_request(text: str) -> Dict[str, Any]:
+    """Chat completion arguments that label one transcript (or chunk) into speaker turns"""
+    return {
+        "model": "gpt-4o-mini",  # Cheaper model for speaker detection
+        "messages": [
+            {"role": "system", "content": SPEAKER_SYSTEM_PROMPT},
+            {"role": "user", "content": SPEAKER_PROMPT_TEMPLATE.format(text=text)}
+        ],
+        "max_tokens": speaker_max_tokens(text),
+        "temperature": 0.1,
+        "response_format": SPEAKER_RESPONSE_FORMAT
+    }
+
+async def label_chunks(chunk_texts: List[str], api_key: str) -> List[List[Dict[str, str]]]:
+    """Label all chunks concurrently, keeping them in order"""
+    async with async_client(api_key) as client:
         
-        formatted_conversation = response.choices[0].message.content.strip()
+        async def _label(chunk_text):
+            response = await client.chat.completions.create(**speaker_request(chunk_text))
+            return json.loads(response.choices[0].message.content)["turns"]
         
-        # Parse the formatted conversation
-        speakers = {}
-        lines = formatted_conversation.split('\n')
+        return await asyncio.gather(*[_label(chunk_text) for chunk_text in chunk_texts])
+
+def merge_chunk_turns(chunk_turns: List[List[Dict[str, str]]], overlaps: List[str]) -> List[Dict[str, str]]:
+    """Join per-chunk turns, mapping each chunk's labels onto the speakers seen so far"""
+    merged = list(chunk_turns[0])
+    
+    for turns, overlap in zip(chunk_turns[1:], overlaps):
+        if not merged or not turns:
+            merged.extend(turns)
+            continue
         
-        for line in lines:
-            line = line.strip()
-            if ':' in line:
-                speaker_part, text_part = line.split(':', 1)
-                speaker = speaker_part.strip()
-                text = text_part.strip()
-                
-                if speaker not in speakers:
-                    speakers[speaker] = []
-                speakers[speaker].append(text)
+        # Each chunk starts with the previous chunk's last sentence, so its first
+        # speaker is whoever ended the previous chunk; other labels take the
+        # remaining known speakers, most recently heard first
+        recent_speakers = list(dict.fromkeys(turn["speaker"] for turn in reversed(merged)))
+        mapping = {turns[0]["speaker"]: recent_speakers[0]}
+        available = recent_speakers[1:]
+        for turn in turns:
+            if turn["speaker"] not in mapping:
+                if available:
+                    mapping[turn["speaker"]] = available.pop(0)
+                else:
+                    used = set(recent_speakers) | set(mapping.values())
+                    mapping[turn["speaker"]] = next(
+                        f"Speaker {letter}" for letter in string.ascii_uppercase if f"Speaker {letter}" not in used
+                    )
         
-        return {
-            "formatted_conversation": formatted_conversation,
-            "speakers": speakers,
-            "speaker_count": len(speakers)
-        }
+        # Drop the repeated overlap sentence and continue the previous turn
+        first_text = turns[0]["text"].strip()
+        if first_text.startswith(overlap):
+            first_text = first_text[len(overlap):].strip()
+        elif overlap.startswith(first_text):
+            first_text = ""
+        if first_text:
+            merged[-1] = {"speaker": merged[-1]["speaker"], "text": f"{merged[-1]['text']} {first_text}"}
         
+        merged.extend({"speaker": mapping[turn["speaker"]], "text": turn["text"]} for turn in turns[1:])
+    
+    return merged
+
+def label_speaker_turns(text: str, client: OpenAI) -> List[Dict[str, str]]:
+    """Speaker turns for a transcript, labelling long ones in parallel chunks"""
+    chunks = chunk_transcript(text) if len(text.split()) > SPEAKER_CHUNK_THRESHOLD_WORDS else [text]
+    
+    if len(chunks) == 1:
+        response = client.chat.completions.create(**speaker_request(text))
+        return json.loads(response.choices[0].message.content)["turns"]
+    
+    # Repeat each chunk's last sentence at the start of the next one so
+    # speakers can be matched across chunks
+    overlaps = [chunk[-1] for chunk in chunks[:-1]]
+    chunk_texts = [" ".join(chunks[0])] + [
+        " ".join([overlap] + chunk) for overlap, chunk in zip(overlaps, chunks[1:])
+    ]
+    
+    chunk_turns = asyncio.run(label_chunks(chunk_texts, client.api_key))
+    return merge_chunk_turns(chunk_turns, overlaps)
+
+def speaker_data_from_turns(turns: List[Dict[str, str]]) -> Dict[str, Any]:
+    """Group speaker turns by speaker and rebuild the labelled conversation"""
+    speakers = defaultdict(list)
+    for turn in turns:
+        speakers[turn["speaker"]].append(turn["text"])
+    
+    return {
+        "formatted_conversation": "\n".join(f"{turn['speaker']}: {turn['text']}" for turn in turns),
+        "speakers": dict(speakers),
+        "speaker_count": len(speakers)
+    }
+
+def detect_speakers_ai(text: str, client: OpenAI) -> Dict[str, Any]:
+    """Use OpenAI to detect speakers in conversation text"""
+    
+    # The same transcript from any recording, ignoring whitespace, skips the chat completions
+    speakers_key = f"speakers-{hashlib.sha256(' '.join(text.split()).encode()).hexdigest()}"
+    try:
+        return load_cached_results(speakers_key)
+    except (OSError, ValueError):
+        pass
+    
+    try:
+        turns = label_speaker_turns(text, client)
     except Exception as e:
-        # Fallback: simple speaker detection
-        return {
-            "formatted_conversation": f"Speaker A: {text}",
-            "speakers": {"Speaker A": [text]},
-            "speaker_count": 1
-        }
+        # Fallback: simple speaker detection, flagged so it is never cached
+        return {**single_speaker_data(text), "error": str(e)}
+    
+    speaker_data = speaker_data_from_turns(turns)
+    try:
+        save_cached_results(speakers_key, speaker_data)
+    except OSError:
+        pass  # Not cached; the labelled result is still returned
+    return speaker_data
 
-def analyze_text_with_speakers(text: str, speaker_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Enhanced text analysis with speaker information"""
+# Colour markers for the first speakers; anyone else gets SPEAKER_DEFAULT_ICON
+SPEAKER_ICONS = (("Speaker A", "🔵"), ("Speaker B", "🟢"), ("Speaker C", "🟡"))
+SPEAKER_DEFAULT_ICON = "⚫"
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def render_conversation_html(formatted_conversation: str) -> str:
+    """Colour-coded HTML for a labelled conversation, built once per conversation"""
+    paragraphs = []
+    for line in formatted_conversation.split('\n'):
+        match = SPEAKER_LINE_RE.match(line)
+        if match:
+            speaker, text = match.groups()
+            icon = next((icon for label, icon in SPEAKER_ICONS if label in speaker), SPEAKER_DEFAULT_ICON)
+            paragraphs.append(f"<p><strong>{icon} {html.escape(speaker)}:</strong> {html.escape(text)}</p>")
+        elif line.strip():
+            paragraphs.append(f"<p>{html.escape(line)}</p>")
+    
+    return "\n".join(paragraphs)
+
+def analyze_transcript(text: str) -> Dict[str, Any]:
+    """Text analysis that needs only the transcript, not the speakers"""
     
-    # Simple keyword detection
-    safety_keywords = ["safety", "hazard", "risk", "danger", "accident", "injury", "ppe", "protective", "lockout", "emergency"]
-    quality_keywords = ["defect", "quality", "inspection", "tolerance", "reject", "standard", "compliance", "testing", "specification"]
-    production_keywords = ["production", "schedule", "deadline", "capacity", "manufacturing", "assembly", "efficiency", "downtime"]
+    # One pass over the transcript counts keywords and words and collects
+    # the first 5 meaningful sentences as key points
+    mentions = {"safety": 0, "quality": 0, "production": 0}
+    word_count = 0
+    key_points = []
+    sentence_start = 0
     
-    # Count keywords
-    text_lower = text.lower()
-    safety_count = sum(1 for word in safety_keywords if word in text_lower)
-    quality_count = sum(1 for word in quality_keywords if word in text_lower)
-    production_count = sum(1 for word in production_keywords if word in text_lower)
+    for match in TRANSCRIPT_SCAN_RE.finditer(text):
+        kind = match.lastgroup
+        start = match.start()
+        
+        # Every whitespace-delimited word begins with exactly one match
+        if start == 0 or text[start - 1].isspace():
+            word_count += 1
+        
+        if kind == "sentence_end":
+            sentence = text[sentence_start:start].strip()
+            if len(sentence) > 10 and len(key_points) < 5:
+                key_points.append(sentence)
+            sentence_start = match.end()
+        elif kind != "word":
+            mentions[kind] += 1
+    
+    # Text after the last sentence mark is a sentence too
+    sentence = text[sentence_start:].strip()
+    if len(sentence) > 10 and len(key_points) < 5:
+        key_points.append(sentence)
+    
+    safety_count = mentions["safety"]
+    quality_count = mentions["quality"]
+    production_count = mentions["production"]
     
     # Determine main topic
     if safety_count > quality_count and safety_count > production_count:
@@ -106,34 +500,102 @@ def analyze_text_with_speakers(text: str, speaker_data: Dict[str, Any]) -> Dict[
     else:
         main_topic = "General Discussion"
     
-    # Extract key points from conversation
-    sentences = [s.strip() for s in text.split('.') if s.strip() and len(s.strip()) > 10]
-    key_points = sentences[:5]  # First 5 meaningful sentences
+    return {
+        "main_topic": main_topic,
+        "safety_mentions": safety_count,
+        "quality_mentions": quality_count,
+        "production_mentions": production_count,
+        "key_points": key_points,
+        "word_count": word_count,
+        "estimated_duration": f"{word_count / 150:.1f} minutes"
+    }
+
+def merge_speaker_stats(analysis: Dict[str, Any], speaker_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Add per-speaker keyword and word counts to a transcript analysis"""
     
     # Analyze speaker contributions
     speaker_analysis = {}
     for speaker, utterances in speaker_data.get("speakers", {}).items():
-        speaker_text = " ".join(utterances).lower()
+        speaker_text = " ".join(utterances)
+        
+        # Same whole-word matching as the transcript scan, so speaker totals add up to it
+        speaker_mentions = Counter(KEYWORD_CATEGORIES[keyword.lower()] for keyword in KEYWORD_RE.findall(speaker_text))
+        
         speaker_analysis[speaker] = {
             "utterances": len(utterances),
             "words": len(speaker_text.split()),
-            "safety_mentions": sum(1 for word in safety_keywords if word in speaker_text),
-            "quality_mentions": sum(1 for word in quality_keywords if word in speaker_text),
-            "production_mentions": sum(1 for word in production_keywords if word in speaker_text)
+            "safety_mentions": speaker_mentions["safety"],
+            "quality_mentions": speaker_mentions["quality"],
+            "production_mentions": speaker_mentions["production"]
         }
     
     return {
-        "main_topic": main_topic,
-        "safety_mentions": safety_count,
-        "quality_mentions": quality_count,
-        "production_mentions": production_count,
-        "key_points": key_points,
-        "word_count": len(text.split()),
-        "estimated_duration": f"{len(text.split()) / 150:.1f} minutes",
+        **analysis,
         "speaker_analysis": speaker_analysis,
         "total_speakers": speaker_data.get("speaker_count", 1)
     }
 
+def analyze_text_with_speakers(text: str, speaker_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Enhanced text analysis with speaker information"""
+    return merge_speaker_stats(analyze_transcript(text), speaker_data)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def encode_results(transcript: str, formatted_conversation: str, analysis: Dict[str, Any], timestamp: str) -> bytes:
+    """Compact JSON export of one processed recording, encoded once per result"""
+    return json.dumps({
+        "original_transcript": transcript,
+        "conversation_with_speakers": formatted_conversation,
+        "analysis": analysis,
+        "timestamp": timestamp
+    }, separators=(',', ':')).encode("utf-8")
+
+# Static help and footer content, built once instead of inside every rerun of main()
+HELP_MARKDOWN = """
+### Simple Steps:
+1. **Upload Audio File:**
+   - Click "Browse files" above
+   - Select your audio recording (MP3, WAV, M4A, etc.)
+   - Click "Process Audio"
+
+2. **View Results:**
+   - **🗣️ Conversation tab**: See who said what with speaker identification
+   - **📊 Analysis tab**: Topics, keywords, manufacturing insights
+   - **👥 Speakers tab**: Individual speaker analysis and contributions
+
+3. **Export Results:**
+   - Download complete analysis as JSON file
+   - Share with team or integrate into your systems
+
+### What This Demo Analyzes:
+- ✅ **Speech-to-Text** with 99% accuracy
+- ✅ **Speaker Identification** - who said what
+- ✅ **Manufacturing Topics** - safety, quality, production focus
+- ✅ **Key Insights** - action items, important points
+- ✅ **Conversation Flow** - meeting phases and transitions
+
+### Supported File Types:
+- **Audio Formats:** MP3, WAV, M4A, FLAC, OGG
+- **Max File Size:** 25MB
+- **Max Duration:** 25 minutes
+- **Multiple Speakers:** Up to 10 speakers per conversation
+
+### Perfect For:
+- **Quality Control** meetings and inspections
+- **Safety briefings** and training sessions
+- **Production planning** and scheduling meetings
+- **Equipment maintenance** discussions
+- **Compliance** and audit recordings
+"""
+
+FOOTER_HTML = """
+---
+
+<div style='text-align: center; color: #666; font-size: 14px;'>
+<p>🚀 <strong>This is a live demonstration</strong> of AI-powered speech recognition and analysis</p>
+<p>Ready to transform your manufacturing conversations? Let's discuss implementation for your organization.</p>
+</div>
+"""
+
 def main():
     st.set_page_config(
         page_title="AI Speech Recognition & Analysis Platform",
@@ -145,10 +607,13 @@ def main():
     st.markdown("**Transform your manufacturing conversations into actionable insights**")
     
     # Get API key from environment (hidden from client)
-    api_key = os.getenv("OPENAI_API_KEY")
+    api_key = get_config().api_key
     
     if not api_key or api_key == "your_api_key_here":
         st.error("🔧 **Demo Setup Required**: Please contact your demo administrator to configure the API key.")
+        
+        # Look again on the next rerun, once the key has been added
+        get_config.clear()
         st.stop()
     
     # Sidebar for demo info
@@ -180,6 +645,13 @@ def main():
         - **Manufacturing-specific** insights
         - **Instant analysis** and reporting
         """)
+        
+        st.header("⚙️ Settings")
+        compress_upload = st.toggle(
+            "Compress audio before upload",
+            disabled=not shutil.which("ffmpeg"),
+            help="Re-encodes the recording as 16 kHz mono before sending it to Whisper. Requires ffmpeg."
+        )
     
     # Main interface
     col1, col2 = st.columns([1, 1])
@@ -197,7 +669,7 @@ def main():
             st.success(f"✅ File uploaded: {uploaded_file.name}")
             
             # Show file info
-            file_size = len(uploaded_file.getvalue()) / 1024 / 1024  # MB
+            file_size = uploaded_file.size / 1024 / 1024  # MB
             st.info(f"📊 File size: {file_size:.1f} MB")
             
             if file_size > 25:
@@ -207,36 +679,50 @@ def main():
             if st.button("🚀 Process Audio", type="primary"):
                 with st.spinner("🔄 Processing audio..."):
                     try:
-                        # Initialize OpenAI client
-                        client = OpenAI(api_key=api_key)
-                        
-                        # Save uploaded file temporarily
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-                            tmp_file.write(uploaded_file.getvalue())
-                            tmp_file_path = tmp_file.name
-                        
-                        # Step 1: Transcribe using OpenAI Whisper
-                        st.info("🎧 Step 1: Converting speech to text...")
-                        with open(tmp_file_path, "rb") as audio_file:
-                            transcript = client.audio.transcriptions.create(
-                                model="whisper-1",
-                                file=audio_file,
-                                response_format="json"
-                            )
-                        
-                        # Step 2: Detect speakers using AI
-                        st.info("👥 Step 2: Identifying speakers...")
-                        speaker_data = detect_speakers_ai(transcript.text, client)
-                        
-                        # Step 3: Analyze conversation
-                        st.info("🔍 Step 3: Analyzing conversation...")
-                        analysis = analyze_text_with_speakers(transcript.text, speaker_data)
+                        # Re-uploads of the same file reuse the saved results
+                        audio_hash = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+                        try:
+                            cached_results = load_cached_results(audio_hash)
+                        except (OSError, ValueError):
+                            cached_results = None
+                        record_cache_lookup(get_cache_stats(), bool(cached_results))
                         
-                        # Clean up temp file
-                        os.unlink(tmp_file_path)
+                        if cached_results:
+                            st.info("⚡ Loaded saved results for this file")
+                            transcript_text = cached_results["transcript"]
+                            speaker_data = cached_results["speaker_data"]
+                            analysis = cached_results["analysis"]
+                        else:
+                            # Shared OpenAI client
+                            client = get_client(api_key)
+                            
+                            # Step 1: Transcribe using OpenAI Whisper
+                            st.info("🎧 Step 1: Converting speech to text...")
+                            transcripts = transcribe_audio(uploaded_file, client, api_key, compress_upload)
+                            transcript_text = " ".join(transcript.text.strip() for transcript in transcripts)
+                            
+                            # Steps 2 and 3: the transcript-only analysis runs on a worker
+                            # thread while speakers are detected, unless only one person is talking
+                            st.info("👥 Step 2: Identifying speakers...")
+                            st.info("🔍 Step 3: Analyzing conversation...")
+                            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+                                analysis_future = executor.submit(analyze_transcript, transcript_text)
+                                if is_monologue(transcripts):
+                                    speaker_data = single_speaker_data(transcript_text)
+                                else:
+                                    speaker_data = detect_speakers_ai(transcript_text, client)
+                                analysis = merge_speaker_stats(analysis_future.result(), speaker_data)
+                            
+                            # A failed speaker detection is retried on the next upload
+                            if "error" not in speaker_data:
+                                save_cached_results(audio_hash, {
+                                    "transcript": transcript_text,
+                                    "speaker_data": speaker_data,
+                                    "analysis": analysis
+                                })
                         
                         # Store results in session state
-                        st.session_state.transcript = transcript.text
+                        st.session_state.transcript = transcript_text
                         st.session_state.speaker_data = speaker_data
                         st.session_state.analysis = analysis
                         st.session_state.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -246,13 +732,6 @@ def main():
                     except Exception as e:
                         st.error(f"❌ Error: {str(e)}")
                         st.info("💡 Check your API key and internet connection")
-                        
-                        # Clean up temp file if it exists
-                        if 'tmp_file_path' in locals():
-                            try:
-                                os.unlink(tmp_file_path)
-                            except:
-                                pass
     
     with col2:
         st.header("📋 Results")
@@ -266,25 +745,10 @@ def main():
                 
                 # Show formatted conversation
                 if st.session_state.speaker_data.get("formatted_conversation"):
-                    conversation_lines = st.session_state.speaker_data["formatted_conversation"].split('\n')
-                    
-                    for line in conversation_lines:
-                        if ':' in line:
-                            speaker_part, text_part = line.split(':', 1)
-                            speaker = speaker_part.strip()
-                            text = text_part.strip()
-                            
-                            # Color-code speakers
-                            if "Speaker A" in speaker:
-                                st.markdown(f"**🔵 {speaker}:** {text}")
-                            elif "Speaker B" in speaker:
-                                st.markdown(f"**🟢 {speaker}:** {text}")
-                            elif "Speaker C" in speaker:
-                                st.markdown(f"**🟡 {speaker}:** {text}")
-                            else:
-                                st.markdown(f"**⚫ {speaker}:** {text}")
-                        else:
-                            st.markdown(line)
+                    st.markdown(
+                        render_conversation_html(st.session_state.speaker_data["formatted_conversation"]),
+                        unsafe_allow_html=True
+                    )
                 
                 # Original transcript
                 with st.expander("📄 Original Transcript"):
@@ -330,39 +794,43 @@ def main():
             with tab3:
                 st.subheader("👥 Speaker Analysis")
                 
-                # Speaker breakdown
-                for speaker, stats in st.session_state.analysis["speaker_analysis"].items():
-                    with st.expander(f"{speaker} - {stats['utterances']} utterances, {stats['words']} words"):
-                        col1, col2, col3 = st.columns(3)
-                        
-                        with col1:
-                            st.metric("Safety", stats["safety_mentions"])
-                        with col2:
-                            st.metric("Quality", stats["quality_mentions"])
-                        with col3:
-                            st.metric("Production", stats["production_mentions"])
+                # Speaker breakdown, rendered only for the selected speaker
+                speaker_analysis = st.session_state.analysis["speaker_analysis"]
+                speaker = st.selectbox("Select speaker", list(speaker_analysis))
+                
+                if speaker:
+                    stats = speaker_analysis[speaker]
+                    st.caption(f"{stats['utterances']} utterances, {stats['words']} words")
+                    col1, col2, col3 = st.columns(3)
+                    
+                    with col1:
+                        st.metric("Safety", stats["safety_mentions"])
+                    with col2:
+                        st.metric("Quality", stats["quality_mentions"])
+                    with col3:
+                        st.metric("Production", stats["production_mentions"])
+                    
+                    # Show speaker's utterances
+                    if speaker in st.session_state.speaker_data.get("speakers", {}):
+                        st.markdown("**What they said:**")
+                        for i, utterance in enumerate(st.session_state.speaker_data["speakers"][speaker][:3], 1):
+                            st.write(f"{i}. {utterance}")
                         
-                        # Show speaker's utterances
-                        if speaker in st.session_state.speaker_data.get("speakers", {}):
-                            st.markdown("**What they said:**")
-                            for i, utterance in enumerate(st.session_state.speaker_data["speakers"][speaker][:3], 1):
-                                st.write(f"{i}. {utterance}")
-                            
-                            if len(st.session_state.speaker_data["speakers"][speaker]) > 3:
-                                st.write(f"... and {len(st.session_state.speaker_data['speakers'][speaker]) - 3} more")
+                        if len(st.session_state.speaker_data["speakers"][speaker]) > 3:
+                            st.write(f"... and {len(st.session_state.speaker_data['speakers'][speaker]) - 3} more")
             
             # Download results
             st.subheader("💾 Export Results")
-            results = {
-                "original_transcript": st.session_state.transcript,
-                "conversation_with_speakers": st.session_state.speaker_data.get("formatted_conversation", ""),
-                "analysis": st.session_state.analysis,
-                "timestamp": st.session_state.timestamp
-            }
+            results_json = encode_results(
+                st.session_state.transcript,
+                st.session_state.speaker_data.get("formatted_conversation", ""),
+                st.session_state.analysis,
+                st.session_state.timestamp
+            )
             
             st.download_button(
                 "📥 Download Complete Results (JSON)",
-                data=json.dumps(results, indent=2),
+                data=results_json,
                 file_name=f"conversation_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                 mime="application/json"
             )
@@ -408,51 +876,20 @@ def main():
     
     # Instructions
     with st.expander("📖 How to use this demo"):
-        st.markdown("""
-        ### Simple Steps:
-        1. **Upload Audio File:**
-           - Click "Browse files" above
-           - Select your audio recording (MP3, WAV, M4A, etc.)
-           - Click "Process Audio"
-        
-        2. **View Results:**
-           - **🗣️ Conversation tab**: See who said what with speaker identification
-           - **📊 Analysis tab**: Topics, keywords, manufacturing insights
-           - **👥 Speakers tab**: Individual speaker analysis and contributions
-        
-        3. **Export Results:**
-           - Download complete analysis as JSON file
-           - Share with team or integrate into your systems
-        
-        ### What This Demo Analyzes:
-        - ✅ **Speech-to-Text** with 99% accuracy
-        - ✅ **Speaker Identification** - who said what
-        - ✅ **Manufacturing Topics** - safety, quality, production focus
-        - ✅ **Key Insights** - action items, important points
-        - ✅ **Conversation Flow** - meeting phases and transitions
-        
-        ### Supported File Types:
-        - **Audio Formats:** MP3, WAV, M4A, FLAC, OGG
-        - **Max File Size:** 25MB
-        - **Max Duration:** 25 minutes
-        - **Multiple Speakers:** Up to 10 speakers per conversation
-        
-        ### Perfect For:
-        - **Quality Control** meetings and inspections
-        - **Safety briefings** and training sessions
-        - **Production planning** and scheduling meetings
-        - **Equipment maintenance** discussions
-                 - **Compliance** and audit recordings
-         """)
+        st.markdown(HELP_MARKDOWN)
     
     # Footer
-    st.markdown("---")
-    st.markdown("""
-    <div style='text-align: center; color: #666; font-size: 14px;'>
-    <p>🚀 <strong>This is a live demonstration</strong> of AI-powered speech recognition and analysis</p>
-    <p>Ready to transform your manufacturing conversations? Let's discuss implementation for your organization.</p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(FOOTER_HTML, unsafe_allow_html=True)
+    
+    # Rendered last so the counts include this run's lookup
+    with st.sidebar:
+        st.header("⚡ Results Cache")
+        cache_counts = get_cache_stats()["counts"]
+        col_hits, col_misses = st.columns(2)
+        with col_hits:
+            st.metric("Hits", cache_counts["hits"])
+        with col_misses:
+            st.metric("Misses", cache_counts["misses"])
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -2,26 +2,32 @@
 """
 AI Speech Recognition & Analysis Platform
 - Clean Streamlit components only
-- Proper audio preview with base64 encoding
+- Audio preview served by st.audio
 - No CSS overrides
 """
 
 import os
 import json
-import base64
+import re
+import string
+import itertools
+from collections import Counter
+import hashlib
+import threading
+import asyncio
+import concurrent.futures
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Tuple, Dict, Any
+import httpx
 import streamlit as st
 try:
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
 except ImportError:
     st.error("OpenAI library not installed. Please install with: pip install openai")
     st.stop()
 import tempfile
 from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+from transcript_chunks import SPEAKER_CHUNK_THRESHOLD_WORDS, chunk_transcript, speaker_max_tokens
 
 # Disable ALL proxy settings that might interfere with OpenAI client on Streamlit Cloud
 import urllib3
@@ -31,69 +37,136 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 for proxy_var in ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy', 'ALL_PROXY', 'all_proxy']:
     os.environ.pop(proxy_var, None)
 
-def get_api_key():
-    """Get API key from Streamlit secrets or environment"""
-    # Try Streamlit secrets first (for cloud deployment)
+# Whisper and speaker-detection results, one JSON file per step and input digest
+PIPELINE_CACHE_DIR = os.path.join(".cache", "pipeline")
+
+PIPELINE_CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+# Read size for hashing and copying audio without holding a second full copy
+FILE_CHUNK_SIZE = 1024 * 1024
+
+def cache_key(data):
+    """SHA-256 digest identifying a pipeline input"""
+    return hashlib.sha256(data).hexdigest()
+
+def file_cache_key(f):
+    """SHA-256 digest of a file object's contents, read in chunks"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(FILE_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def load_cached_step(step, key):
+    """Cached result of a pipeline step for an input digest, or None"""
+    path = os.path.join(PIPELINE_CACHE_DIR, f"{step}-{key}.json")
     try:
-        if hasattr(st, 'secrets') and 'OPENAI_API_KEY' in st.secrets:
-            return st.secrets["OPENAI_API_KEY"]
-    except:
-        pass
+        with open(path, "r") as f:
+            value = json.load(f)
+        
+        # Touch the entry so eviction drops the least recently used files first
+        os.utime(path)
+        return value
+    except (OSError, ValueError):
+        return None
+
+def save_cached_step(step, key, value):
+    """Persist the result of a pipeline step for an input digest"""
+    os.makedirs(PIPELINE_CACHE_DIR, exist_ok=True)
+    path = os.path.join(PIPELINE_CACHE_DIR, f"{step}-{key}.json")
     
-    # Try environment variable (for local development)
-    api_key = os.getenv("OPENAI_API_KEY")
-    if api_key:
-        return api_key
+    # Write under a temporary name so concurrent sessions never read half a file
+    with open(f"{path}.part", "w") as f:
+        json.dump(value, f)
+    os.replace(f"{path}.part", path)
     
-    # Try streamlit secrets as dict access
+    entries = sorted(
+        (entry for entry in os.scandir(PIPELINE_CACHE_DIR) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    total_size = sum(entry.stat().st_size for entry in entries)
+    for entry in entries:
+        if total_size <= PIPELINE_CACHE_MAX_BYTES:
+            break
+        total_size -= entry.stat().st_size
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass  # Already evicted by another session
+
+@st.cache_resource(show_spinner=False)
+def get_cache_stats():
+    """Pipeline cache hit and miss counts, shared by every session of this process"""
+    return {"counts": Counter(), "lock": threading.Lock()}
+
+def record_cache_lookup(cache_stats, hit):
+    """Count one pipeline cache lookup as a hit or a miss"""
+    with cache_stats["lock"]:
+        cache_stats["counts"]["hits" if hit else "misses"] += 1
+
+# .env sits next to the app, whatever directory Streamlit was started from
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+
+@st.cache_resource(show_spinner=False)
+def get_api_key():
+    """Get API key from Streamlit secrets or environment, once per process"""
+    # Streamlit secrets first (for cloud deployment); a missing secrets
+    # file is normal locally, so check for it instead of letting it error
     try:
-        return st.secrets.get("OPENAI_API_KEY")
-    except:
-        pass
+        if st.secrets.load_if_toml_exists() and "OPENAI_API_KEY" in st.secrets:
+            return st.secrets["OPENAI_API_KEY"]
+    except Exception:
+        pass  # Malformed secrets.toml; fall back to the environment
     
-    # Return None if not found
-    return None
+    # Environment variable (for local development), read from .env if present
+    if os.path.exists(ENV_PATH):
+        load_dotenv(ENV_PATH)
+    return os.getenv("OPENAI_API_KEY")
 
-def get_audio_base64(file_path):
-    """Convert audio file to base64 for preview"""
-    try:
-        with open(file_path, "rb") as f:
-            data = f.read()
-        return base64.b64encode(data).decode()
-    except Exception as e:
-        st.error(f"Error loading audio: {str(e)}")
-        return None
+# Keep-alive pool shared by every session's API requests
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+
+@st.cache_resource(show_spinner=False)
+def get_client(api_key):
+    """One OpenAI client per API key, so its connection pool survives reruns"""
+    # Force OpenAI client to bypass proxy settings completely
+    http_client = httpx.Client(proxies=None, timeout=30.0, limits=HTTP_LIMITS)
+    return OpenAI(
+        api_key=api_key,
+        http_client=http_client,
+        timeout=30.0,
+        max_retries=3
+    )
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def get_sample_bytes(file_path, mtime):
+    """Contents of a sample audio file, cached until the file changes"""
+    with open(file_path, "rb") as f:
+        return f.read()
 
-def create_audio_player(file_path, audio_format="mp3"):
-    """Create HTML audio player with base64 data"""
-    b64_data = get_audio_base64(file_path)
-    if b64_data:
-        audio_html = f"""
-        <audio controls style="width: 100%;">
-            <source src="data:audio/{audio_format};base64,{b64_data}" type="audio/{audio_format}">
-            Your browser does not support the audio element.
-        </audio>
-        """
-        return audio_html
-    return None
+# Bytes written per chunk while streaming TTS audio to disk
+TTS_CHUNK_SIZE = 65536
 
 def generate_sample_audio_on_demand(scenario_name, script_text, client):
     """Generate sample audio on-demand using OpenAI TTS"""
     try:
-        response = client.audio.speech.create(
+        # Stream the body so disk writes start with the first audio bytes
+        with client.audio.speech.with_streaming_response.create(
             model="tts-1",
             voice="alloy",
             input=script_text,
-            speed=1.0
-        )
+            speed=1.0,
+            response_format="mp3"
+        ) as response:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_file:
+                for chunk in response.iter_bytes(TTS_CHUNK_SIZE):
+                    temp_file.write(chunk)
         
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        response.stream_to_file(temp_file.name)
         return temp_file.name
     except Exception as e:
         st.error(f"Error generating sample audio: {str(e)}")
         return None
 
+@st.cache_data(show_spinner=False)
 def get_sample_scenarios():
     """Get sample conversation scenarios"""
     return {
@@ -111,28 +184,33 @@ def get_sample_scenarios():
         }
     }
 
+# Pre-generated sample files and the names they are shown under
+SAMPLE_AUDIO_FILES = {
+    "safety_briefing.mp3": "Safety Briefing",
+    "quality_control.mp3": "Quality Control",
+    "production_planning.mp3": "Production Planning",
+    "safety_meeting_discussion.mp3": "Safety Meeting Discussion",
+    "quality_control_investigation.mp3": "Quality Control Investigation",
+    "production_planning_crisis.mp3": "Production Planning Crisis"
+}
+
+@st.cache_data(show_spinner=False, ttl=300)
 def load_sample_audio_files():
     """Load available sample audio files"""
     sample_files = {}
     
     # Check for local sample files first
     sample_dir = "sample_audio"
-    if os.path.exists(sample_dir):
-        sample_mappings = {
-            "safety_briefing.mp3": "Safety Briefing",
-            "quality_control.mp3": "Quality Control",
-            "production_planning.mp3": "Production Planning",
-            "safety_meeting_discussion.mp3": "Safety Meeting Discussion",
-            "quality_control_investigation.mp3": "Quality Control Investigation",
-            "production_planning_crisis.mp3": "Production Planning Crisis"
-        }
+    if os.path.isdir(sample_dir):
+        # One directory read instead of two stat calls per expected file
+        entries = {entry.name: entry for entry in os.scandir(sample_dir)}
         
-        for filename, display_name in sample_mappings.items():
-            filepath = os.path.join(sample_dir, filename)
-            if os.path.exists(filepath):
-                file_size = os.path.getsize(filepath) / 1024  # KB
+        for filename, display_name in SAMPLE_AUDIO_FILES.items():
+            entry = entries.get(filename)
+            if entry is not None and entry.is_file():
+                file_size = entry.stat().st_size / 1024  # KB
                 sample_files[display_name] = {
-                    "path": filepath,
+                    "path": entry.path,
                     "size": f"{file_size:.1f} KB",
                     "type": "Pre-generated"
                 }
@@ -150,58 +228,159 @@ def load_sample_audio_files():
     
     return sample_files
 
-def detect_speakers_ai(text: str, client: OpenAI) -> Dict[str, Any]:
-    """Use OpenAI to detect speakers in conversation text"""
+# Manufacturing keywords, as sets for per-token lookups
+SAFETY_KEYWORDS = frozenset(["safety", "hazard", "risk", "danger", "accident", "injury", "ppe", "protective", "lockout", "emergency"])
+QUALITY_KEYWORDS = frozenset(["defect", "quality", "inspection", "tolerance", "reject", "standard", "compliance", "testing", "specification"])
+PRODUCTION_KEYWORDS = frozenset(["production", "schedule", "deadline", "capacity", "manufacturing", "assembly", "efficiency", "downtime"])
+
+# Every keyword mapped to its category, so one lookup classifies a token
+KEYWORD_CATEGORIES = {
+    **{keyword: "safety" for keyword in SAFETY_KEYWORDS},
+    **{keyword: "quality" for keyword in QUALITY_KEYWORDS},
+    **{keyword: "production" for keyword in PRODUCTION_KEYWORDS}
+}
+
+def _keyword_pattern(keywords):
+    """Compile a case-insensitive whole-word pattern matching any keyword"""
+    return re.compile(r"\b(?:" + "|".join(sorted(keywords)) + r")\b", re.IGNORECASE)
+
+# All keywords in one whole-word pattern, so the transcript is scanned once
+KEYWORD_RE = _keyword_pattern(KEYWORD_CATEGORIES)
+
+# One sentence of the transcript, up to the next period, question or exclamation mark
+SENTENCE_RE = re.compile(r"[^.!?]+")
+
+# Structured output the speaker detection reply must follow
+SPEAKER_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "speaker_turns",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "turns": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "speaker": {"type": "string"},
+                            "text": {"type": "string"}
+                        },
+                        "required": ["speaker", "text"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["turns"],
+            "additionalProperties": False
+        }
+    }
+}
+
+def speaker_request(text: str) -> Dict[str, Any]:
+    """Chat completion arguments that label one transcript (or chunk) into speaker turns"""
+    # Short instruction; the response schema defines the output shape
+    prompt = f'Split this conversation into speaker turns labelled Speaker A, Speaker B, Speaker C, etc.\n\n{text}'
+    
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "You are an expert at identifying speakers in conversations. Return only the speaker turns."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": speaker_max_tokens(text),
+        "temperature": 0.1,
+        "response_format": SPEAKER_RESPONSE_FORMAT
+    }
+
+def parse_speaker_turns(response) -> List[Tuple[str, str]]:
+    """(speaker, text) pairs from a structured speaker-turns reply"""
+    return [
+        (turn["speaker"], turn["text"])
+        for turn in json.loads(response.choices[0].message.content)["turns"]
+    ]
+
+async def label_chunks(chunk_texts: List[str], api_key: str) -> List[List[Tuple[str, str]]]:
+    """Label all chunks concurrently, keeping them in order"""
+    # Async connections belong to the event loop, so this client lives for one run
+    http_client = httpx.AsyncClient(proxies=None, timeout=30.0, limits=HTTP_LIMITS)
+    async with AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=3) as client:
+        
+        async def _label(chunk_text):
+            return parse_speaker_turns(await client.chat.completions.create(**speaker_request(chunk_text)))
+        
+        return await asyncio.gather(*[_label(chunk_text) for chunk_text in chunk_texts])
+
+def merge_chunk_turns(chunk_turns: List[List[Tuple[str, str]]], overlaps: List[str]) -> List[Tuple[str, str]]:
+    """Join per-chunk turns, mapping each chunk's labels onto the speakers seen so far"""
+    merged = list(chunk_turns[0])
+    
+    for turns, overlap in zip(chunk_turns[1:], overlaps):
+        if not merged or not turns:
+            merged.extend(turns)
+            continue
+        
+        # Each chunk starts with the previous chunk's last sentence, so its first
+        # speaker is whoever ended the previous chunk; other labels take the
+        # remaining known speakers, most recently heard first
+        recent_speakers = list(dict.fromkeys(speaker for speaker, _ in reversed(merged)))
+        mapping = {turns[0][0]: recent_speakers[0]}
+        available = recent_speakers[1:]
+        for speaker, _ in turns:
+            if speaker not in mapping:
+                if available:
+                    mapping[speaker] = available.pop(0)
+                else:
+                    used = set(recent_speakers) | set(mapping.values())
+                    mapping[speaker] = next(
+                        f"Speaker {letter}" for letter in string.ascii_uppercase if f"Speaker {letter}" not in used
+                    )
+        
+        # Drop the repeated overlap sentence and continue the previous turn
+        first_text = turns[0][1].strip()
+        if first_text.startswith(overlap):
+            first_text = first_text[len(overlap):].strip()
+        elif overlap.startswith(first_text):
+            first_text = ""
+        if first_text:
+            merged[-1] = (merged[-1][0], f"{merged[-1][1]} {first_text}")
+        
+        merged.extend((mapping[speaker], utterance) for speaker, utterance in turns[1:])
     
-    prompt = f"""
-    Analyze this conversation and identify different speakers. Format the response as a conversation with speaker labels.
+    return merged
+
+def label_speaker_turns(text: str, client: OpenAI) -> List[Tuple[str, str]]:
+    """Speaker turns for a transcript, labelling long ones in parallel chunks"""
+    chunks = chunk_transcript(text) if len(text.split()) > SPEAKER_CHUNK_THRESHOLD_WORDS else [text]
     
-    Original text: "{text}"
+    if len(chunks) == 1:
+        return parse_speaker_turns(client.chat.completions.create(**speaker_request(text)))
     
-    Instructions:
-    1. Identify likely speaker changes (new person talking)
-    2. Format as: "Speaker A: [text]" for each part
-    3. Use Speaker A, Speaker B, Speaker C, etc.
-    4. If unclear, use your best judgment based on conversation flow
-    5. Return ONLY the formatted conversation, no explanations
+    # Repeat each chunk's last sentence at the start of the next one so
+    # speakers can be matched across chunks
+    overlaps = [chunk[-1] for chunk in chunks[:-1]]
+    chunk_texts = [" ".join(chunks[0])] + [
+        " ".join([overlap] + chunk) for overlap, chunk in zip(overlaps, chunks[1:])
+    ]
     
-    Example output:
-    Speaker A: Hello everyone, let's start the meeting.
-    Speaker B: Good morning, I have the safety report ready.
-    Speaker A: Great, please go ahead.
-    """
+    chunk_turns = asyncio.run(label_chunks(chunk_texts, client.api_key))
+    return merge_chunk_turns(chunk_turns, overlaps)
+
+def detect_speakers_ai(text: str, client: OpenAI) -> Dict[str, Any]:
+    """Use OpenAI to detect speakers in conversation text"""
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert at identifying speakers in conversations. Return only the formatted conversation with speaker labels."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1000,
-            temperature=0.1
-        )
-        
-        formatted_conversation = response.choices[0].message.content.strip()
+        turns = label_speaker_turns(text, client)
         
-        # Parse the formatted conversation
         speakers = {}
-        lines = formatted_conversation.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if ':' in line:
-                speaker_part, text_part = line.split(':', 1)
-                speaker = speaker_part.strip()
-                text = text_part.strip()
-                
-                if speaker not in speakers:
-                    speakers[speaker] = []
-                speakers[speaker].append(text)
+        for speaker, utterance in turns:
+            speakers.setdefault(speaker, []).append(utterance)
         
         return {
-            "formatted_conversation": formatted_conversation,
+            "formatted_conversation": "\n".join(f"{speaker}: {utterance}" for speaker, utterance in turns),
             "speakers": speakers,
+            "turns": turns,
             "speaker_count": len(speakers)
         }
         
@@ -209,20 +388,17 @@ def detect_speakers_ai(text: str, client: OpenAI) -> Dict[str, Any]:
         return {
             "formatted_conversation": f"Speaker A: {text}",
             "speakers": {"Speaker A": [text]},
+            "turns": [("Speaker A", text)],
             "speaker_count": 1
         }
 
-def analyze_text_with_speakers(text: str, speaker_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Enhanced text analysis with speaker information"""
-    
-    safety_keywords = ["safety", "hazard", "risk", "danger", "accident", "injury", "ppe", "protective", "lockout", "emergency"]
-    quality_keywords = ["defect", "quality", "inspection", "tolerance", "reject", "standard", "compliance", "testing", "specification"]
-    production_keywords = ["production", "schedule", "deadline", "capacity", "manufacturing", "assembly", "efficiency", "downtime"]
+def analyze_transcript(text: str) -> Dict[str, Any]:
+    """Text analysis that needs only the transcript, not the speakers"""
     
-    text_lower = text.lower()
-    safety_count = sum(1 for word in safety_keywords if word in text_lower)
-    quality_count = sum(1 for word in quality_keywords if word in text_lower)
-    production_count = sum(1 for word in production_keywords if word in text_lower)
+    mentions = Counter(KEYWORD_CATEGORIES[keyword.lower()] for keyword in KEYWORD_RE.findall(text))
+    safety_count = mentions["safety"]
+    quality_count = mentions["quality"]
+    production_count = mentions["production"]
     
     if safety_count > quality_count and safety_count > production_count:
         main_topic = "Safety Discussion"
@@ -233,32 +409,86 @@ def analyze_text_with_speakers(text: str, speaker_data: Dict[str, Any]) -> Dict[
     else:
         main_topic = "General Discussion"
     
-    sentences = [s.strip() for s in text.split('.') if s.strip() and len(s.strip()) > 10]
-    key_points = sentences[:5]
+    # Stop scanning once the first 5 meaningful sentences are found
+    sentences = (match.group().strip() for match in SENTENCE_RE.finditer(text))
+    key_points = list(itertools.islice((s for s in sentences if len(s) > 10), 5))
+    
+    word_count = len(text.split())
+    
+    return {
+        "main_topic": main_topic,
+        "safety_mentions": safety_count,
+        "quality_mentions": quality_count,
+        "production_mentions": production_count,
+        "key_points": key_points,
+        "word_count": word_count,
+        "estimated_duration": f"{word_count / 150:.1f} minutes"
+    }
+
+def merge_speaker_stats(analysis: Dict[str, Any], speaker_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Add per-speaker statistics to a transcript analysis"""
     
     speaker_analysis = {}
     for speaker, utterances in speaker_data.get("speakers", {}).items():
-        speaker_text = " ".join(utterances).lower()
+        speaker_text = " ".join(utterances)
+        
+        # Same whole-word matching as the transcript scan, so speaker totals add up to it
+        speaker_mentions = Counter(KEYWORD_CATEGORIES[keyword.lower()] for keyword in KEYWORD_RE.findall(speaker_text))
+        
         speaker_analysis[speaker] = {
             "utterances": len(utterances),
             "words": len(speaker_text.split()),
-            "safety_mentions": sum(1 for word in safety_keywords if word in speaker_text),
-            "quality_mentions": sum(1 for word in quality_keywords if word in speaker_text),
-            "production_mentions": sum(1 for word in production_keywords if word in speaker_text)
+            "safety_mentions": speaker_mentions["safety"],
+            "quality_mentions": speaker_mentions["quality"],
+            "production_mentions": speaker_mentions["production"]
         }
     
     return {
-        "main_topic": main_topic,
-        "safety_mentions": safety_count,
-        "quality_mentions": quality_count,
-        "production_mentions": production_count,
-        "key_points": key_points,
-        "word_count": len(text.split()),
-        "estimated_duration": f"{len(text.split()) / 150:.1f} minutes",
+        **analysis,
         "speaker_analysis": speaker_analysis,
         "total_speakers": speaker_data.get("speaker_count", 1)
     }
 
+def analyze_text_with_speakers(text: str, speaker_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Enhanced text analysis with speaker information"""
+    return merge_speaker_stats(analyze_transcript(text), speaker_data)
+
+def transcribe_file(client: OpenAI, audio_file) -> str:
+    """Transcribe an open file or a (filename, file, content type) tuple with Whisper"""
+    # Plain-text output needs no JSON parsing; a fixed language skips
+    # Whisper's language detection
+    return client.audio.transcriptions.create(
+        model="whisper-1",
+        file=audio_file,
+        response_format="text",
+        language="en"
+    ).strip()
+
+def cached_detect_speakers(text: str, client: OpenAI, cache_stats: Dict[str, Any]) -> Dict[str, Any]:
+    """detect_speakers_ai, reusing the result for a transcript seen before"""
+    transcript_key = cache_key(text.encode())
+    speaker_data = load_cached_step("gpt-4o-mini-speakers", transcript_key)
+    record_cache_lookup(cache_stats, speaker_data is not None)
+    
+    if speaker_data is None:
+        speaker_data = detect_speakers_ai(text, client)
+        
+        # A single speaker may be the error fallback, so only keep real splits
+        if speaker_data["speaker_count"] > 1:
+            save_cached_step("gpt-4o-mini-speakers", transcript_key, speaker_data)
+    
+    return speaker_data
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def encode_results(transcript: str, formatted_conversation: str, analysis: Dict[str, Any], timestamp: str) -> bytes:
+    """JSON export of one processed recording, encoded once per result"""
+    return json.dumps({
+        "original_transcript": transcript,
+        "conversation_with_speakers": formatted_conversation,
+        "analysis": analysis,
+        "timestamp": timestamp
+    }, indent=2).encode("utf-8")
+
 def main():
     st.set_page_config(
         page_title="AI Speech Recognition & Analysis Platform",
@@ -280,6 +510,9 @@ def main():
         st.warning("**For local development:**")
         st.code("Add your API key to .env file: OPENAI_API_KEY=your-api-key-here")
         st.info("Get your API key from: https://platform.openai.com/api-keys")
+        
+        # Look again on the next rerun, once the key has been added
+        get_api_key.clear()
         st.stop()
     
     # Create two columns
@@ -299,11 +532,8 @@ def main():
                 
                 # Audio preview if file exists
                 if file_info['path'] and os.path.exists(file_info['path']):
-                    audio_html = create_audio_player(file_info['path'])
-                    if audio_html:
-                        st.markdown(audio_html, unsafe_allow_html=True)
-                    else:
-                        st.info("Audio file ready for processing")
+                    # Streamed from Streamlit's media endpoint rather than inlined as base64
+                    st.audio(file_info['path'], format="audio/mp3")
                 
                 # Buttons
                 col_load, col_download = st.columns([3, 1])
@@ -318,15 +548,7 @@ def main():
                             with st.spinner(f"Generating {name} sample audio..."):
                                 # Initialize OpenAI client for sample generation
                                 try:
-                                    # Force OpenAI client to bypass proxy settings completely
-                                    import httpx
-                                    http_client = httpx.Client(proxies=None, timeout=30.0)
-                                    client = OpenAI(
-                                        api_key=api_key,
-                                        http_client=http_client,
-                                        timeout=30.0,
-                                        max_retries=3
-                                    )
+                                    client = get_client(api_key)
                                     temp_file_path = generate_sample_audio_on_demand(
                                         name, 
                                         file_info['script'], 
@@ -345,14 +567,13 @@ def main():
                 
                 with col_download:
                     if file_info['path'] and os.path.exists(file_info['path']):
-                        with open(file_info['path'], "rb") as file:
-                            st.download_button(
-                                label="Download",
-                                data=file.read(),
-                                file_name=f"{name.lower().replace(' ', '_')}.mp3",
-                                mime="audio/mpeg",
-                                key=f"download_{name}"
-                            )
+                        st.download_button(
+                            label="Download",
+                            data=get_sample_bytes(file_info['path'], os.path.getmtime(file_info['path'])),
+                            file_name=f"{name.lower().replace(' ', '_')}.mp3",
+                            mime="audio/mpeg",
+                            key=f"download_{name}"
+                        )
                 
                 st.divider()
         
@@ -367,14 +588,11 @@ def main():
         # Handle file processing
         file_to_process = None
         file_name = None
-        cached_audio_bytes = None
         
         if uploaded_file is not None:
             st.success(f"File uploaded: {uploaded_file.name}")
             
-            # Cache audio bytes
-            cached_audio_bytes = uploaded_file.getvalue()
-            file_size = len(cached_audio_bytes) / 1024 / 1024
+            file_size = uploaded_file.size / 1024 / 1024
             st.info(f"File size: {file_size:.1f} MB")
             
             if file_size > 25:
@@ -382,7 +600,7 @@ def main():
                 st.stop()
             
             # Audio preview for uploaded files
-            st.audio(cached_audio_bytes, format=f"audio/{uploaded_file.name.split('.')[-1]}")
+            st.audio(uploaded_file, format=f"audio/{uploaded_file.name.split('.')[-1]}")
             
             file_to_process = uploaded_file
             file_name = uploaded_file.name
@@ -391,78 +609,76 @@ def main():
             st.success(f"Sample file ready: {st.session_state.sample_name}")
             file_size = os.path.getsize(st.session_state.sample_file) / 1024 / 1024
             st.info(f"File size: {file_size:.1f} MB")
+            st.audio(st.session_state.sample_file, format="audio/mp3")
             file_to_process = st.session_state.sample_file
             file_name = st.session_state.sample_name
         
         # Process button
         if file_to_process is not None:
             if st.button("🚀 Process Audio", type="primary"):
-                with st.spinner("Processing audio..."):
+                with st.status("Processing audio...", expanded=True) as status:
                     try:
                         # Initialize OpenAI client with proper error handling
                         try:
-                            # Force OpenAI client to bypass proxy settings completely
-                            import httpx
-                            http_client = httpx.Client(proxies=None, timeout=30.0)
-                            client = OpenAI(
-                                api_key=api_key,
-                                http_client=http_client,
-                                timeout=30.0,
-                                max_retries=3
-                            )
+                            client = get_client(api_key)
                         except Exception as client_error:
                             st.error(f"Failed to initialize OpenAI client: {str(client_error)}")
                             st.error("This may be due to an invalid API key or proxy configuration issue.")
+                            status.update(label="Processing failed", state="error")
                             return
                         
-                        # Handle file paths
+                        # Re-processing the same audio reuses earlier API results
+                        cache_stats = get_cache_stats()
                         if isinstance(file_to_process, str):  # Sample file
-                            audio_file_path = file_to_process
-                            temp_file = False
+                            with open(file_to_process, "rb") as f:
+                                audio_key = file_cache_key(f)
                         else:  # Uploaded file
-                            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_to_process.name.split('.')[-1]}") as tmp_file:
-                                if cached_audio_bytes is not None:
-                                    tmp_file.write(cached_audio_bytes)
-                                else:
-                                    tmp_file.write(file_to_process.getvalue())
-                                audio_file_path = tmp_file.name
-                            temp_file = True
+                            file_to_process.seek(0)
+                            audio_key = file_cache_key(file_to_process)
                         
                         # Process audio
-                        st.info("Step 1: Converting speech to text...")
-                        with open(audio_file_path, "rb") as audio_file:
-                            transcript = client.audio.transcriptions.create(
-                                model="whisper-1",
-                                file=audio_file,
-                                response_format="json"
-                            )
+                        st.write("Step 1: Converting speech to text...")
+                        transcript_text = load_cached_step("whisper-1", audio_key)
+                        record_cache_lookup(cache_stats, transcript_text is not None)
                         
-                        st.info("Step 2: Identifying speakers...")
-                        speaker_data = detect_speakers_ai(transcript.text, client)
+                        if transcript_text is None:
+                            if isinstance(file_to_process, str):  # Sample file
+                                with open(file_to_process, "rb") as audio_file:
+                                    transcript_text = transcribe_file(client, audio_file)
+                            else:  # Uploaded file, sent straight from memory
+                                file_to_process.seek(0)
+                                transcript_text = transcribe_file(
+                                    client,
+                                    (file_to_process.name, file_to_process, file_to_process.type or "audio/mpeg")
+                                )
+                            
+                            save_cached_step("whisper-1", audio_key, transcript_text)
                         
-                        st.info("Step 3: Analyzing conversation...")
-                        analysis = analyze_text_with_speakers(transcript.text, speaker_data)
+                        # Show the transcript right away instead of after the slower speaker step
+                        st.text_area("Transcript:", transcript_text, height=150, disabled=True)
+                        status.update(label="Identifying speakers...")
                         
-                        # Clean up temp file
-                        if temp_file:
-                            os.unlink(audio_file_path)
+                        # The speaker API call and the transcript-only analysis are
+                        # independent, so run them side by side
+                        st.write("Step 2: Identifying speakers and analyzing conversation...")
+                        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+                            speakers_future = executor.submit(cached_detect_speakers, transcript_text, client, cache_stats)
+                            analysis_future = executor.submit(analyze_transcript, transcript_text)
+                            speaker_data = speakers_future.result()
+                            analysis = merge_speaker_stats(analysis_future.result(), speaker_data)
                         
                         # Store results
-                        st.session_state.transcript = transcript.text
+                        st.session_state.transcript = transcript_text
                         st.session_state.speaker_data = speaker_data
                         st.session_state.analysis = analysis
                         st.session_state.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                         st.session_state.processed_file = file_name
                         
-                        st.success("✅ Processing complete!")
+                        status.update(label="✅ Processing complete!", state="complete", expanded=False)
                         
                     except Exception as e:
                         st.error(f"Error: {str(e)}")
-                        if 'audio_file_path' in locals() and temp_file:
-                            try:
-                                os.unlink(audio_file_path)
-                            except:
-                                pass
+                        status.update(label="Processing failed", state="error")
     
     with col2:
         st.header("📊 Results")
@@ -474,26 +690,11 @@ def main():
             with tab1:
                 st.subheader("Conversation with Speakers")
                 
-                if st.session_state.speaker_data.get("formatted_conversation"):
-                    conversation_lines = st.session_state.speaker_data["formatted_conversation"].split('\n')
-                    
-                    for line in conversation_lines:
-                        if ':' in line:
-                            speaker_part, text_part = line.split(':', 1)
-                            speaker = speaker_part.strip()
-                            text = text_part.strip()
-                            
-                            # Display with speaker tags
-                            if "Speaker A" in speaker:
-                                st.markdown(f"**{speaker}:** {text}")
-                            elif "Speaker B" in speaker:
-                                st.markdown(f"**{speaker}:** {text}")
-                            elif "Speaker C" in speaker:
-                                st.markdown(f"**{speaker}:** {text}")
-                            else:
-                                st.markdown(f"**{speaker}:** {text}")
-                        else:
-                            st.markdown(line)
+                # One element for the whole conversation instead of one per turn
+                st.markdown("\n\n".join(
+                    f"**{speaker}:** {text}"
+                    for speaker, text in st.session_state.speaker_data.get("turns", [])
+                ))
                 
                 with st.expander("View Original Transcript"):
                     st.text_area(
@@ -560,16 +761,17 @@ def main():
             
             # Export results
             st.subheader("📥 Export Results")
-            results = {
-                "original_transcript": st.session_state.transcript,
-                "conversation_with_speakers": st.session_state.speaker_data.get("formatted_conversation", ""),
-                "analysis": st.session_state.analysis,
-                "timestamp": st.session_state.timestamp
-            }
+            # Reruns from tab clicks reuse the encoded export instead of re-serializing
+            results_json = encode_results(
+                st.session_state.transcript,
+                st.session_state.speaker_data.get("formatted_conversation", ""),
+                st.session_state.analysis,
+                st.session_state.timestamp
+            )
             
             st.download_button(
                 "Download Complete Results (JSON)",
-                data=json.dumps(results, indent=2),
+                data=results_json,
                 file_name=f"conversation_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                 mime="application/json"
             )
@@ -601,6 +803,18 @@ def main():
         st.markdown("- **Equipment maintenance** discussions")
         st.markdown("- **Compliance monitoring**")
         
+        st.header("Result Cache")
+        cache_counts = get_cache_stats()["counts"]
+        col_hits, col_misses = st.columns(2)
+        with col_hits:
+            st.metric("Hits", cache_counts["hits"])
+        with col_misses:
+            st.metric("Misses", cache_counts["misses"])
+        
+        # Sample listing is cached for a few minutes; the callback clears it
+        # before the rerun, so newly generated files show up straight away
+        st.button("Refresh samples", on_click=load_sample_audio_files.clear)
+        
         st.header("Key Benefits")
         st.markdown("- **99% accuracy** speech recognition")
         st.markdown("- **Automatic documentation**")
@@ -0,0 +1,47 @@
+"""
+Transcript Chunking
+Shared by demo.py and streamlit_app.py, so both label speakers with the same reply budget
+"""
+
+import re
+from typing import List
+
+# Long transcripts are labelled in parallel chunks small enough for one reply budget
+SPEAKER_CHUNK_WORDS = 400
+SPEAKER_CHUNK_THRESHOLD_WORDS = 450
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Run-on or unpunctuated text is cut into pieces of at most this many words,
+# so it still chunks and the sentence repeated between chunks stays short
+SENTENCE_MAX_WORDS = 50
+
+def speaker_max_tokens(text: str) -> int:
+    """Reply budget for labelling text; the reply repeats the transcript plus labels"""
+    return min(1000, max(128, len(text.split()) * 2 + 64))
+
+def split_sentences(text: str) -> List[str]:
+    """The transcript's sentences, with overlong ones cut at word boundaries"""
+    sentences = []
+    for sentence in SENTENCE_SPLIT_RE.split(text.strip()):
+        words = sentence.split()
+        if len(words) <= SENTENCE_MAX_WORDS:
+            sentences.append(sentence)
+        else:
+            sentences.extend(
+                " ".join(words[start:start + SENTENCE_MAX_WORDS])
+                for start in range(0, len(words), SENTENCE_MAX_WORDS)
+            )
+    return sentences
+
+def chunk_transcript(text: str, max_words: int = SPEAKER_CHUNK_WORDS) -> List[List[str]]:
+    """Group the transcript's sentences into chunks of at most max_words words"""
+    chunks = [[]]
+    chunk_words = 0
+    for sentence in split_sentences(text):
+        sentence_words = len(sentence.split())
+        if chunks[-1] and chunk_words + sentence_words > max_words:
+            chunks.append([])
+            chunk_words = 0
+        chunks[-1].append(sentence)
+        chunk_words += sentence_words
+    return chunks
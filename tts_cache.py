@@ -0,0 +1,53 @@
+"""
+TTS Cache Helpers
+Shared by the sample audio generators, which both write sample_audio/.cache
+"""
+
+import os
+import hashlib
+import tempfile
+import contextlib
+import httpx
+
+# Keep-alive pool shared by every TTS request
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+
+# Content-addressed store of previously synthesized audio
+TTS_CACHE_DIR = "sample_audio/.cache"
+
+def tts_key(model, voice, text):
+    """Digest identifying one (model, voice, text) synthesis input"""
+    return hashlib.sha256(f"{model}|{voice}|{text}".encode()).hexdigest()
+
+def tts_cache_path(model, voice, text):
+    """Path of the cached audio for one (model, voice, text) input"""
+    return os.path.join(TTS_CACHE_DIR, f"{tts_key(model, voice, text)}.mp3")
+
+def is_up_to_date(output_path, key):
+    """True when output_path exists and its .sha256 sidecar records the same input"""
+    try:
+        with open(f"{output_path}.sha256") as f:
+            return f.read().strip() == key and os.path.exists(output_path)
+    except OSError:
+        return False
+
+def mark_up_to_date(output_path, key):
+    """Record which input output_path was rendered from"""
+    with open(f"{output_path}.sha256", "w") as f:
+        f.write(key)
+
+@contextlib.contextmanager
+def cache_writer(cache_path):
+    """Binary file that replaces cache_path only once it has been written completely"""
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    
+    # A unique temporary name per writer, so concurrent requests for the same
+    # input never share a file and a failed download never poisons the cache
+    partial = tempfile.NamedTemporaryFile(dir=TTS_CACHE_DIR, suffix=".part", delete=False)
+    try:
+        with partial:
+            yield partial
+        os.replace(partial.name, cache_path)
+    finally:
+        if os.path.exists(partial.name):
+            os.unlink(partial.name)